@@ -2,6 +2,7 @@
 # StorageMixins are borrowed from https://github.com/sehmaschine/django-filebrowser/
 
 import os, shutil
+import copy
 import json
 import logging
 import posixpath
@@ -11,9 +12,12 @@ from django.core.files.storage import FileSystemStorage
 from django.core.exceptions import ImproperlyConfigured, SuspiciousOperation,\
     ObjectDoesNotExist
 from django.utils.translation import get_language
+from django.template import Template
 from django.conf import settings
 import mimetypes
 
+from .utils import SingleFlight
+
 logger = logging.getLogger(__name__)
 
 METADATA_LOADERS = {
@@ -63,14 +67,19 @@ class FSPageStorage(object):
     
     def __init__(self, backend=None, index_document='index.html',
           metadata_extension='.meta.json', metadata_loader=METADATA_LOADERS['json'],
-          metadata_defaults=METADATA_DEFAULTS):
+          metadata_defaults=METADATA_DEFAULTS, max_concurrent_loads=None):
         if backend is None:
             raise ImproperlyConfigured(u"No django storage is not provided")        
+        if max_concurrent_loads is not None and max_concurrent_loads < 1:
+            raise ImproperlyConfigured(u"max_concurrent_loads must be None or "
+                                       u"a positive number")
         self.storage = check_mixin(backend)
         self.index_document = index_document
         self.metadata_extension = metadata_extension
         self.metadata_loader = metadata_loader
         self.metadata_defaults = metadata_defaults
+        self.loader = SingleFlight(max_concurrent=max_concurrent_loads)
+        self.compiler = SingleFlight(max_concurrent=max_concurrent_loads)
     
     def get(self, path, lang=None, fallback=True):
         """
@@ -90,20 +99,50 @@ class FSPageStorage(object):
         data = metadata = None
         if lang != settings.LANGUAGE_CODE:
             localepath = u"%s/%s" % (lang, path)
-            res = self._get(localepath)
+            res = self._load(localepath)
             if res:
                 data, metadata, is_index = res
+                # the result may be shared by coalesced requests
+                metadata = copy.deepcopy(metadata)
                 return FSPage(path, data, metadata, lang, storage=self,
                               is_index=is_index)
         if fallback:
-            res = self._get(path)
+            res = self._load(path)
             if res:
                 data, metadata, is_index = res
+                # the result may be shared by coalesced requests
+                metadata = copy.deepcopy(metadata)
                 return FSPage(path, data, metadata, settings.LANGUAGE_CODE, 
                               storage=self, is_index=is_index)
 
         raise ObjectDoesNotExist(u"Page %s is not found" % path)
     
+    def template(self, page):
+        """
+        Return compiled django Template for the page. Concurrent compilations
+        of the same page are coalesced into one.
+        """
+        # included templates are resolved at compile time for active language
+        key = (get_language(), page.language, page.path, page.data)
+        return self.compiler.do(key, Template, page.data)
+    
+    def load_stats(self):
+        """
+        Return dictionary with counters for page loads ('pages') and template
+        compilations ('templates'), see fspages.utils.SingleFlight.stats
+        """
+        return {
+            'pages': self.loader.stats(),
+            'templates': self.compiler.stats(),
+        }
+    
+    def _load(self, path):
+        """
+        Same as _get, but concurrent loads of the same path are coalesced into
+        one, and limited to max_concurrent_loads.
+        """
+        return self.loader.do(path, self._get, path)
+    
     def _get(self, path):
         """
         Return page string, metadata dictionary at the given path, or
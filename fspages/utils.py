@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
 import posixpath
+import sys
+import threading
+import time
+
+from django.utils import six
 
 def find_paths(path, storage, language=None):
     """
@@ -16,3 +21,109 @@ def find_paths(path, storage, language=None):
         innerpath = posixpath.join(path, d)
         for p in find_paths(innerpath, storage, language=language):
             yield p
+
+class SingleFlight(object):
+    """
+    Coalesce concurrent calls for the same key: the first caller runs the
+    function, other callers wait for it and receive the same result (or
+    exception).
+    
+    If max_concurrent is set, no more than max_concurrent functions are run
+    at the same time; extra callers block until a slot is free. The function
+    must not call do() of the same instance, as it would wait for a slot (or
+    for itself) forever.
+    
+    If the first caller is interrupted by an exception that is not an
+    Exception subclass (KeyboardInterrupt, SystemExit, timeouts), it is not
+    passed to the waiters: one of them runs the function again instead.
+    """
+    
+    def __init__(self, max_concurrent=None):
+        self._lock = threading.Lock()
+        self._calls = {}
+        if max_concurrent is not None:
+            self._limiter = threading.BoundedSemaphore(max_concurrent)
+        else:
+            self._limiter = None
+        self._stats = {
+            'loads': 0,
+            'waiters': 0,
+            'wait_time': 0.0,
+            'limited': 0,
+            'limit_wait_time': 0.0,
+        }
+    
+    def do(self, key, func, *args, **kwargs):
+        "Call func(*args, **kwargs) unless a call for key is already running"
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    self._stats['waiters'] += 1
+            if leader:
+                return self._run(key, call, func, args, kwargs)
+            
+            start = time.time()
+            call.done.wait()
+            self._record('wait_time', time.time() - start)
+            if call.retry:
+                continue
+            if call.exc_info is not None:
+                six.reraise(*call.exc_info)
+            return call.result
+    
+    def stats(self):
+        """
+        Return a copy of the counters: number of loads run, number of
+        coalesced waiters and total time (in seconds) they spent waiting,
+        number of loads delayed by max_concurrent and time spent delayed.
+        """
+        with self._lock:
+            return self._stats.copy()
+    
+    def _run(self, key, call, func, args, kwargs):
+        try:
+            self._acquire()
+            try:
+                call.result = func(*args, **kwargs)
+            finally:
+                if self._limiter is not None:
+                    self._limiter.release()
+        except Exception:
+            call.exc_info = sys.exc_info()
+            raise
+        except BaseException:
+            call.retry = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self._stats['loads'] += 1
+            call.done.set()
+        return call.result
+    
+    def _acquire(self):
+        if self._limiter is None:
+            return
+        if self._limiter.acquire(False):
+            return
+        self._record('limited', 1)
+        start = time.time()
+        self._limiter.acquire()
+        self._record('limit_wait_time', time.time() - start)
+    
+    def _record(self, name, value):
+        with self._lock:
+            self._stats[name] += value
+
+class _Call(object):
+    "In-flight SingleFlight call"
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+        self.retry = False
@@ -8,7 +8,7 @@ from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist,\
     SuspiciousOperation
 from django.utils.translation import ugettext as _
 from django.core.urlresolvers import resolve, reverse
-from django.template import Template, RequestContext
+from django.template import RequestContext
 
 logger = logging.getLogger(__name__)
 
@@ -47,8 +47,7 @@ def serve(request, path=None, storage=None):
     if page.metadata['redirect_path'] is not False:
         return HttpResponseRedirect(page.metadata['redirect_path'])
     
-    data = page.data
-    template = Template(data)
+    template = storage.template(page)
     context = RequestContext(request, page.metadata['template_context'])
     s = template.render(context)
     response = HttpResponse(s, mimetype=page.metadata['content-type'], 
@@ -1,4 +1,6 @@
 import sys
+import time
+import threading
 import unittest
 import logging
 from os.path import dirname, abspath, pardir, join as pjoin
@@ -17,10 +19,10 @@ from django.core.exceptions import ImproperlyConfigured
 from django.test import TestCase
 from fspages.storage import FSPageStorage
 from fspages.sitemap import FSPagesSitemap
-from fspages.utils import find_paths
+from fspages.utils import find_paths, SingleFlight
 from django.core.files.storage import FileSystemStorage
 from django.utils.translation import activate
-from django.template import loader
+from django.template import loader, Template
 
 logger = logging.getLogger('fspages') # disable fspages logs as no loggers are initialized by Django
 class NullHandler(logging.Handler):
@@ -100,6 +102,130 @@ class UtilsTests(TestCase):
         self.assertIn('dir/file.txt', paths)
         self.assertEqual(len(paths), 1)
 
+def wait_for(condition):
+    "Poll condition for up to 5 seconds"
+    for i in range(500):
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def start_threads(test, release, targets):
+    """
+    Start a thread for each target; release event is set and threads are
+    joined at test cleanup, even if the test fails.
+    """
+    threads = [threading.Thread(target=target) for target in targets]
+    test.addCleanup(join_threads, threads)
+    test.addCleanup(release.set)
+    for t in threads:
+        t.start()
+    return threads
+
+def join_threads(threads):
+    for t in threads:
+        t.join(5)
+
+class SingleFlightTests(TestCase):
+    """
+    Test fspages.utils.SingleFlight
+    """
+    
+    def test_coalesced(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+        results = []
+        def load():
+            calls.append(1)
+            release.wait()
+            return 'page'
+        def run():
+            results.append(flight.do('key', load))
+        threads = start_threads(self, release, [run] * 5)
+        self.assertTrue(wait_for(lambda: flight.stats()['waiters'] == 4))
+        release.set()
+        join_threads(threads)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['page'] * 5)
+        self.assertEqual(flight.stats()['loads'], 1)
+    
+    def test_error_shared(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        errors = []
+        def load():
+            release.wait()
+            raise IOError("failed")
+        def run():
+            try:
+                flight.do('key', load)
+            except IOError as e:
+                errors.append(e)
+        threads = start_threads(self, release, [run] * 3)
+        self.assertTrue(wait_for(lambda: flight.stats()['waiters'] == 2))
+        release.set()
+        join_threads(threads)
+        self.assertEqual(len(errors), 3)
+        # failed call is not cached
+        self.assertEqual(flight.do('key', lambda: 'page'), 'page')
+    
+    def test_base_exception_retried(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        retry_release = threading.Event()
+        calls = []
+        results = []
+        interrupted = []
+        def load():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait()
+                raise KeyboardInterrupt()
+            retry_release.wait()
+            return 'page'
+        def run():
+            try:
+                results.append(flight.do('key', load))
+            except KeyboardInterrupt:
+                interrupted.append(1)
+        self.addCleanup(retry_release.set)
+        threads = start_threads(self, release, [run] * 3)
+        self.assertTrue(wait_for(lambda: flight.stats()['waiters'] == 2))
+        release.set()
+        # one waiter runs the call again, another one waits for it
+        self.assertTrue(wait_for(lambda: flight.stats()['waiters'] == 3))
+        retry_release.set()
+        join_threads(threads)
+        self.assertEqual(len(interrupted), 1)
+        self.assertEqual(results, ['page'] * 2)
+        self.assertEqual(len(calls), 2)
+    
+    def test_max_concurrent(self):
+        flight = SingleFlight(max_concurrent=1)
+        release = threading.Event()
+        calls = []
+        def load(key):
+            calls.append(key)
+            if key == 'first':
+                release.wait()
+        def run_first():
+            flight.do('first', load, 'first')
+        def run_second():
+            flight.do('second', load, 'second')
+        threads = start_threads(self, release, [run_first])
+        self.assertTrue(wait_for(lambda: calls == ['first']))
+        threads += start_threads(self, release, [run_second])
+        self.assertTrue(wait_for(lambda: flight.stats()['limited'] == 1))
+        self.assertEqual(calls, ['first'])
+        time.sleep(0.01)
+        release.set()
+        join_threads(threads)
+        stats = flight.stats()
+        self.assertEqual(calls, ['first', 'second'])
+        self.assertEqual(stats['loads'], 2)
+        self.assertGreater(stats['limit_wait_time'], 0)
+
 class FSPageStorageTests(TestCase):
     """
     Test fspages.storage.FSPageStorage
@@ -162,6 +288,68 @@ class FSPageStorageTests(TestCase):
         date = self.storage.lastmod('bar.txt')
         self.assertTrue(isinstance(date, datetime.datetime))
     
+    def test_template(self):
+        page = self.storage.get('foo.html')
+        template = self.storage.template(page)
+        self.assertIs(template.__class__, Template)
+    
+    def test_template_active_language(self):
+        "Included templates are resolved for the active language"
+        from fspages.storage import FSPage
+        keys = []
+        class RecordingFlight(SingleFlight):
+            def do(self, key, func, *args, **kwargs):
+                keys.append(key)
+                return SingleFlight.do(self, key, func, *args, **kwargs)
+        storage = FSPageStorage(backend=FileSystemStorage(
+            location=pjoin(here, 'test_pages')))
+        storage.compiler = RecordingFlight()
+        page = FSPage('include.html', u'{% include "include.txt" %}', {},
+                      settings.LANGUAGE_CODE, storage=storage)
+        english = storage.template(page).render(Context({}))
+        activate('de')
+        try:
+            deutsch = storage.template(page).render(Context({}))
+        finally:
+            activate(settings.LANGUAGE_CODE)
+        self.assertIn('english', english)
+        self.assertIn('deutsch', deutsch)
+        self.assertNotEqual(keys[0], keys[1])
+    
+    def test_improper_max_concurrent_loads(self):
+        backend = FileSystemStorage(location=pjoin(here, 'test_pages'))
+        self.assertRaises(ImproperlyConfigured, FSPageStorage,
+                          backend=backend, max_concurrent_loads=0)
+    
+    def test_coalesced_get(self):
+        from fspages.storage import FileSystemStorageMixin
+        release = threading.Event()
+        reads = []
+        class BlockingStorage(FileSystemStorage, FileSystemStorageMixin):
+            def _open(self, name, mode='rb'):
+                if name == 'foo.html':
+                    reads.append(name)
+                    release.wait()
+                return FileSystemStorage._open(self, name, mode)
+        storage = FSPageStorage(backend=BlockingStorage(
+            location=pjoin(here, 'test_pages')), max_concurrent_loads=2)
+        pages = []
+        def run():
+            pages.append(storage.get('foo.html', settings.LANGUAGE_CODE))
+        threads = start_threads(self, release, [run] * 5)
+        self.assertTrue(wait_for(
+            lambda: storage.load_stats()['pages']['waiters'] == 4))
+        release.set()
+        join_threads(threads)
+        self.assertEqual(reads, ['foo.html'])
+        self.assertEqual(storage.load_stats()['pages']['loads'], 1)
+        self.assertEqual(len(pages), 5)
+        self.assertEqual(len(set(id(p.metadata) for p in pages)), 5)
+        self.assertEqual(len(set(id(p.metadata['template_context'])
+                                 for p in pages)), 5)
+        self.assertEqual(pages[0].metadata['template_context'],
+                         {'variable': 'VALUE'})
+    
     def test_index_document_proper_mimetype(self):
         page = self.storage.get('')
         self.assertEqual(page.metadata['content-type'], 'text/html')